@@ -0,0 +1,451 @@
+import glob
+import json
+import os
+import re
+import time
+import traceback
+from collections import Counter
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+class MatchArchive:
+    """將已結束月份的匹配 JSON 壓縮成字典編碼的欄式 npz 月檔
+
+    月檔只在該月結束後寫入一次，之後不再改寫；zip 格式的二進位檔無法被 git
+    做差異壓縮，每天改寫會讓儲存庫每天多存一份完整月檔。
+    """
+
+    # 重複率高的字串欄位：以字典 + 整數代碼儲存
+    DICT_COLUMNS = ['forum', 'forum_name', 'author', 'source']
+    # 幾乎不重複的文字欄位
+    TEXT_COLUMNS = ['title', 'url', 'excerpt', 'content_preview']
+    INT_COLUMNS = ['like_count', 'comment_count']
+
+    # 文章 ID 的原始型別：int、數字字串、其他字串（如 UUID 或空字串，存於 id_text）
+    ID_INT, ID_NUMERIC_TEXT, ID_TEXT = 0, 1, 2
+
+    # save_match 寫出的欄位；含其他欄位的月份不封存，避免刪除 JSON 時遺失資料
+    RECORD_KEYS = set(DICT_COLUMNS + TEXT_COLUMNS + INT_COLUMNS) | {
+        'id', 'matched_keywords', 'created_at', 'found_at', 'found_at_utc'
+    }
+
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.results_dir = os.path.join(self.base_dir, "results")
+        self.archive_dir = os.path.join(self.results_dir, "archive")
+        self.report_file = os.path.join(self.base_dir, "archive_report.json")
+        # 無法封存的月份及原因；刪除其中的項目即可在下次執行時重試
+        self.unarchivable_file = os.path.join(self.archive_dir, "unarchivable_months.json")
+
+    def ensure_archive_dir(self):
+        """確保封存目錄存在"""
+        if not os.path.exists(self.archive_dir):
+            os.makedirs(self.archive_dir)
+            print(f"📁 創建封存目錄: {self.archive_dir}")
+
+    def current_month(self):
+        """與 save_match 相同的本地日期所在月份，本月的每日檔仍保留為 JSON"""
+        now = datetime.now(timezone.utc)
+        return now.astimezone(tz=None).strftime('%Y-%m')
+
+    def daily_json_files(self):
+        """回傳 {日期: 路徑} 的每日匹配 JSON"""
+        files = {}
+        for path in glob.glob(os.path.join(self.results_dir, "new_api_matches_*.json")):
+            found = re.search(r'new_api_matches_(\d{4}-\d{2}-\d{2})\.json$', path)
+            if found:
+                files[found.group(1)] = path
+        return dict(sorted(files.items()))
+
+    def closed_days(self):
+        """屬於已結束月份、可封存的日期（略過已標記為無法封存的月份）"""
+        month = self.current_month()
+        skipped = self.load_unarchivable()
+        return {
+            day: path for day, path in self.daily_json_files().items()
+            if day[:7] < month and day[:7] not in skipped
+        }
+
+    def load_unarchivable(self):
+        if not os.path.exists(self.unarchivable_file):
+            return {}
+        with open(self.unarchivable_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def mark_unarchivable(self, month, reason):
+        """記錄無法封存的月份，之後不再每次重試改寫"""
+        skipped = self.load_unarchivable()
+        skipped[month] = reason
+        with open(self.unarchivable_file, 'w', encoding='utf-8') as f:
+            json.dump(skipped, f, ensure_ascii=False, indent=2)
+        print(f"⚠️ {month} 標記為無法封存，保留原始 JSON: {reason}")
+
+    @staticmethod
+    def load_json(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def parse_times(values, unit):
+        """把時間字串轉成 datetime64，無法解析則為 NaT"""
+        parsed = []
+        for value in values:
+            value = (value or '').replace(' UTC', '').replace('Z', '')
+            try:
+                parsed.append(np.datetime64(value.replace(' ', 'T'), unit))
+            except ValueError:
+                parsed.append(np.datetime64('NaT', unit))
+        return np.array(parsed, dtype=f'datetime64[{unit}]')
+
+    def encode(self, records):
+        """將匹配紀錄轉成欄式陣列"""
+        columns = {}
+
+        for name in self.DICT_COLUMNS:
+            values = np.array([str(r.get(name, '') or '') for r in records], dtype=str)
+            dictionary, codes = np.unique(values, return_inverse=True)
+            columns[f'{name}_dict'] = dictionary
+            columns[f'{name}_codes'] = codes.astype(np.uint32)
+
+        for name in self.TEXT_COLUMNS:
+            columns[name] = np.array([str(r.get(name, '') or '') for r in records], dtype=str)
+
+        # 文章 ID 以 int64 儲存並記錄原始型別；無法轉成整數的 ID 改存於 id_text
+        id_values, id_kinds, id_texts = [], [], []
+        for post_id in (r.get('id') for r in records):
+            if isinstance(post_id, int) and not isinstance(post_id, bool):
+                id_values.append(post_id)
+                id_kinds.append(self.ID_INT)
+                id_texts.append('')
+            elif isinstance(post_id, str) and re.fullmatch(r'-?[1-9]\d{0,17}|0', post_id):
+                id_values.append(int(post_id))
+                id_kinds.append(self.ID_NUMERIC_TEXT)
+                id_texts.append('')
+            else:
+                id_values.append(0)
+                id_kinds.append(self.ID_TEXT)
+                id_texts.append('' if post_id is None else str(post_id))
+        columns['id'] = np.array(id_values, dtype=np.int64)
+        columns['id_kind'] = np.array(id_kinds, dtype=np.uint8)
+        columns['id_text'] = np.array(id_texts, dtype=str)
+
+        for name in self.INT_COLUMNS:
+            columns[name] = np.array([int(r.get(name, 0) or 0) for r in records], dtype=np.int32)
+
+        # 關鍵字清單：扁平化後以 offsets 切分（CSR 格式）
+        keyword_lists = [r.get('matched_keywords', []) for r in records]
+        flat = np.array([k for keywords in keyword_lists for k in keywords], dtype=str)
+        dictionary, codes = np.unique(flat, return_inverse=True)
+        columns['keyword_dict'] = dictionary
+        columns['keyword_codes'] = codes.astype(np.uint32)
+        columns['keyword_offsets'] = np.concatenate(
+            [[0], np.cumsum([len(keywords) for keywords in keyword_lists])]
+        ).astype(np.int64)
+
+        columns['created_at'] = self.parse_times([r.get('created_at') for r in records], 'ms')
+        columns['found_at'] = self.parse_times([r.get('found_at') for r in records], 's')
+        columns['found_at_utc'] = self.parse_times([r.get('found_at_utc') for r in records], 's')
+        return columns
+
+    def concat(self, parts):
+        """合併多份欄式資料，字典欄位重新編碼；沒有資料時回傳空欄位"""
+        parts = [p for p in parts if len(p['id'])]
+        if not parts:
+            return self.encode([])
+        if len(parts) == 1:
+            return parts[0]
+
+        merged = {}
+        for key in parts[0]:
+            if key.endswith('_dict') or key.endswith('_codes') or key == 'keyword_offsets':
+                continue
+            merged[key] = np.concatenate([p[key] for p in parts])
+
+        names = [key[:-len('_dict')] for key in parts[0] if key.endswith('_dict')]
+        for name in names:
+            decoded = np.concatenate([p[f'{name}_dict'][p[f'{name}_codes']] for p in parts])
+            dictionary, codes = np.unique(decoded, return_inverse=True)
+            merged[f'{name}_dict'] = dictionary
+            merged[f'{name}_codes'] = codes.astype(np.uint32)
+
+        counts = np.concatenate([np.diff(p['keyword_offsets']) for p in parts])
+        merged['keyword_offsets'] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return merged
+
+    @staticmethod
+    def take(columns, mask):
+        """依布林遮罩篩選紀錄，字典保持不變"""
+        offsets = columns['keyword_offsets']
+        rows = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        selected = {}
+        for key, value in columns.items():
+            if key.endswith('_dict'):
+                selected[key] = value
+            elif key == 'keyword_codes':
+                selected[key] = value[mask[rows]]
+            elif key != 'keyword_offsets':
+                selected[key] = value[mask]
+        counts = np.diff(offsets)[mask]
+        selected['keyword_offsets'] = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return selected
+
+    def decode(self, columns):
+        """將欄式資料還原成與 save_match 相同的紀錄格式"""
+        records = []
+        offsets = columns['keyword_offsets']
+        keywords = columns['keyword_dict'][columns['keyword_codes']]
+
+        def format_time(value, fmt):
+            return '' if np.isnat(value) else value.astype(datetime).strftime(fmt)
+
+        for i in range(len(columns['id'])):
+            record = {name: str(columns[name][i]) for name in self.TEXT_COLUMNS}
+            kind = columns['id_kind'][i]
+            if kind == self.ID_TEXT:
+                record['id'] = str(columns['id_text'][i])
+            else:
+                post_id = int(columns['id'][i])
+                record['id'] = str(post_id) if kind == self.ID_NUMERIC_TEXT else post_id
+            for name in self.DICT_COLUMNS:
+                record[name] = str(columns[f'{name}_dict'][columns[f'{name}_codes'][i]])
+            for name in self.INT_COLUMNS:
+                record[name] = int(columns[name][i])
+            record['matched_keywords'] = [str(k) for k in keywords[offsets[i]:offsets[i + 1]]]
+            created = columns['created_at'][i]
+            record['created_at'] = '' if np.isnat(created) else str(created) + 'Z'
+            record['found_at'] = format_time(columns['found_at'][i], '%Y-%m-%d %H:%M:%S')
+            record['found_at_utc'] = format_time(columns['found_at_utc'][i], '%Y-%m-%d %H:%M:%S UTC')
+            records.append(record)
+        return records
+
+    def archive_path(self, month):
+        return os.path.join(self.archive_dir, f"new_api_matches_{month}.npz")
+
+    def archive_paths(self):
+        """所有正式月檔（不含寫入中的暫存檔）"""
+        return sorted(glob.glob(self.archive_path('[0-9][0-9][0-9][0-9]-[0-9][0-9]')))
+
+    def load_archive(self, path):
+        with np.load(path) as data:
+            return {key: data[key] for key in data.files}
+
+    def load_columns(self, include_open_days=True):
+        """載入所有封存月檔（可選擇加上尚未封存的每日 JSON）"""
+        parts = [self.load_archive(path) for path in self.archive_paths()]
+        if include_open_days:
+            for path in self.daily_json_files().values():
+                parts.append(self.encode(self.load_json(path)))
+        return self.concat(parts)
+
+    @staticmethod
+    def week_starts(found_at):
+        """回傳每筆紀錄所屬週的週一日期"""
+        days = found_at.astype('datetime64[D]')
+        # 1970-01-01 是星期四，平移 3 天後週一為 0
+        weekday = (days.astype(np.int64) + 3) % 7
+        return days - weekday.astype('timedelta64[D]')
+
+    def keyword_forum_week_counts(self, columns):
+        """以向量化方式計算 關鍵字 × 論壇 × 週 的匹配數"""
+        offsets = columns['keyword_offsets']
+        rows = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+        weeks, week_codes = np.unique(self.week_starts(columns['found_at']), return_inverse=True)
+        keywords = columns['keyword_dict']
+        forums = columns['forum_dict']
+
+        shape = (len(keywords), len(forums), len(weeks))
+        flat_index = np.ravel_multi_index(
+            (columns['keyword_codes'], columns['forum_codes'][rows], week_codes[rows]), shape
+        )
+        counts = np.bincount(flat_index, minlength=int(np.prod(shape))).reshape(shape)
+        return keywords, forums, weeks, counts
+
+    @staticmethod
+    def json_keyword_forum_week_counts(records):
+        """JSON 版本的相同查詢，僅用於比較"""
+        counts = Counter()
+        for record in records:
+            day = datetime.strptime(record['found_at'][:10], '%Y-%m-%d').date()
+            week = day.fromordinal(day.toordinal() - day.weekday())
+            for keyword in record.get('matched_keywords', []):
+                counts[(keyword, record['forum'], week.isoformat())] += 1
+        return counts
+
+    def counts_dict(self, columns):
+        """將向量化查詢結果轉成與 JSON 版本相同的 {(關鍵字, 論壇, 週): 數量}"""
+        keywords, forums, weeks, counts = self.keyword_forum_week_counts(columns)
+        return {
+            (str(keywords[k]), str(forums[f]), str(weeks[w])): int(counts[k, f, w])
+            for k, f, w in zip(*np.nonzero(counts))
+        }
+
+    @staticmethod
+    def group_by_month(records_by_day):
+        """{日期: 紀錄} → {月份: {日期: 紀錄}}"""
+        by_month = {}
+        for day, records in records_by_day.items():
+            by_month.setdefault(day[:7], {})[day] = records
+        return by_month
+
+    def verify_month(self, month, days, path=None):
+        """重新讀取磁碟上的月檔，確認這些日期的紀錄與查詢結果都和 JSON 相同
+
+        JSON 先經過與 encode 相同的正規化（例如缺少的次數補 0、createdAt 補毫秒）再比較。
+        """
+        expected = self.decode(self.encode([r for records in days.values() for r in records]))
+        path = path or self.archive_path(month)
+        if not os.path.exists(path):
+            return not expected
+
+        columns = self.load_archive(path)
+        found_days = columns['found_at'].astype('datetime64[D]').astype(str)
+        columns = self.take(columns, np.isin(found_days, list(days)))
+        if self.decode(columns) != expected:
+            return False
+        return self.counts_dict(columns) == dict(self.json_keyword_forum_week_counts(expected))
+
+    def write_month(self, month, days):
+        """寫入並驗證月檔，回傳是否通過驗證
+
+        已封存的月份又出現每日檔時，同一天以新資料取代。先寫入暫存檔，
+        驗證通過才取代正式月檔，失敗時不會留下不一致的封存。
+        """
+        path = self.archive_path(month)
+        if os.path.exists(path) and self.verify_month(month, days):
+            print(f"✅ {month} 已封存，不需改寫")
+            return True
+        parts = []
+        if os.path.exists(path):
+            existing = self.load_archive(path)
+            found_days = existing['found_at'].astype('datetime64[D]').astype(str)
+            parts.append(self.take(existing, ~np.isin(found_days, list(days))))
+        parts.append(self.encode([r for records in days.values() for r in records]))
+        columns = self.concat(parts)
+        if not len(columns['id']):
+            print(f"⚠️ {month} 沒有任何紀錄，略過封存")
+            return self.verify_month(month, days)
+
+        temp_path = path[:-len('.npz')] + '.tmp.npz'
+        try:
+            np.savez_compressed(temp_path, **columns)
+            if not self.verify_month(month, days, temp_path):
+                return False
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        print(f"✅ 封存 {month}: {len(columns['id'])} 筆 → {os.path.basename(path)}")
+        return True
+
+    def compact(self, remove_json=True):
+        """封存已結束月份的日期，並輸出與 JSON 的大小 / 查詢時間比較"""
+        closed = self.closed_days()
+        if not closed:
+            print("✅ 沒有需要封存的月份")
+            return None
+
+        self.ensure_archive_dir()
+        print(f"🗜️ 準備封存 {len(closed)} 天的匹配紀錄...")
+
+        records_by_day = {day: self.load_json(path) for day, path in closed.items()}
+
+        # 寫入後重新讀取月檔驗證，通過的月份才刪除對應的每日 JSON；
+        # 單一月份失敗只保留該月 JSON，不影響其他月份與後續的結果提交
+        verified = []
+        for month, days in self.group_by_month(records_by_day).items():
+            extra = sorted({key for records in days.values() for r in records for key in r} - self.RECORD_KEYS)
+            if extra:
+                self.mark_unarchivable(month, f"未封存的欄位: {', '.join(extra)}")
+                continue
+            try:
+                ok = self.write_month(month, days)
+            except Exception as e:
+                traceback.print_exc()
+                self.mark_unarchivable(month, f"封存失敗: {e}")
+                continue
+            if not ok:
+                self.mark_unarchivable(month, "月檔與 JSON 不一致")
+                continue
+            verified.append(month)
+            if remove_json:
+                for day in days:
+                    os.remove(closed[day])
+                print(f"🧹 已刪除 {month} 的 {len(days)} 個每日 JSON")
+
+        report = self.build_report()
+        report['archived_days'] = list(closed)
+        report['verified_months'] = verified
+
+        with open(self.report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+    def build_report(self):
+        """比較整個封存與其對應的全部歷史 JSON 的大小與查詢時間
+
+        已刪除的每日 JSON 以 save_match 相同格式（indent=2）從封存還原後計算大小，
+        JSON 查詢時間為解析這些內容再以 dict 迴圈統計。
+        """
+        paths = self.archive_paths()
+
+        # 封存基準：讀取所有月檔 + 向量化查詢
+        start = time.perf_counter()
+        columns = self.concat([self.load_archive(path) for path in paths])
+        self.keyword_forum_week_counts(columns)
+        archive_seconds = time.perf_counter() - start
+
+        months = {}
+        day_texts = []
+        for path in paths:
+            month = re.search(r'new_api_matches_(\d{4}-\d{2})\.npz$', path).group(1)
+            records_by_day = {}
+            for record in self.decode(self.load_archive(path)):
+                records_by_day.setdefault(record['found_at'][:10], []).append(record)
+            texts = [json.dumps(records, ensure_ascii=False, indent=2) for records in records_by_day.values()]
+            day_texts.extend(texts)
+            months[month] = {
+                'records': sum(len(records) for records in records_by_day.values()),
+                'json_bytes': sum(len(text.encode('utf-8')) for text in texts),
+                'archive_bytes': os.path.getsize(path)
+            }
+
+        # JSON 基準：解析全部歷史 JSON + 以 dict 迴圈查詢
+        start = time.perf_counter()
+        self.json_keyword_forum_week_counts([r for text in day_texts for r in json.loads(text)])
+        json_seconds = time.perf_counter() - start
+
+        json_bytes = sum(m['json_bytes'] for m in months.values())
+        archive_bytes = sum(m['archive_bytes'] for m in months.values())
+        txt_file = os.path.join(self.base_dir, "new_api_matches.txt")
+        report = {
+            'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'records': len(columns['id']),
+            'json_bytes': json_bytes,
+            'archive_bytes': archive_bytes,
+            'size_ratio': round(archive_bytes / json_bytes, 4) if json_bytes else None,
+            'json_query_seconds': round(json_seconds, 6),
+            'archive_query_seconds': round(archive_seconds, 6),
+            'open_json_bytes': sum(os.path.getsize(path) for path in self.daily_json_files().values()),
+            'text_log_bytes': os.path.getsize(txt_file) if os.path.exists(txt_file) else 0,
+            'unarchivable_months': self.load_unarchivable(),
+            'months': months
+        }
+
+        print(f"📦 整個封存: JSON {json_bytes:,} bytes → 封存 {archive_bytes:,} bytes ({report['size_ratio']})")
+        print(f"⏱️ 關鍵字×論壇×週 查詢: JSON {json_seconds:.4f} 秒 / 封存 {archive_seconds:.4f} 秒")
+        return report
+
+
+def main():
+    try:
+        MatchArchive().compact()
+    except Exception as e:
+        print(f"❌ 封存失敗: {e}")
+        traceback.print_exc()
+        exit(1)
+
+if __name__ == "__main__":
+    main()
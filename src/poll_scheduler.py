@@ -0,0 +1,316 @@
+import json
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+
+class PollScheduler:
+    """依各論壇實際的新文章到達率與匹配率安排輪詢間隔和抓取深度"""
+
+    def __init__(self, base_dir, results_dir, forums=None):
+        self.forums = forums
+        self.history_file = os.path.join(results_dir, "poll_history.json")
+        self.plan_file = os.path.join(base_dir, "poll_schedule.json")
+
+        # 全域請求預算：每小時最多抓取幾篇文章內容
+        self.request_budget = int(os.environ.get('POLL_REQUEST_BUDGET', 45))
+
+        # 間隔與深度的上下限（分鐘 / 篇）
+        self.min_interval = 15
+        self.max_interval = 360
+        self.default_interval = 60
+        self.min_depth = 5
+        self.max_depth = 30
+        self.default_depth = 15
+
+        # 每次輪詢期望看到的新文章數，用來反推間隔
+        self.target_new_posts = 8
+        # 到達率 / 匹配率的指數平滑係數
+        self.smoothing = 0.3
+        # cron 啟動可能延遲，提前這麼多分鐘也視為到期
+        self.due_tolerance = 5
+
+        self.max_seen_ids = 500
+        # 同一篇文章抓取內容失敗幾次後放棄（已刪除或不是文章）
+        self.max_retries = 3
+        self.max_runs = 50
+        self.max_lags = 200
+
+        self.history = self.load_history()
+        self.pending_listings = {}
+
+    def load_history(self):
+        """載入輪詢歷史"""
+        history = {}
+        if os.path.exists(self.history_file):
+            try:
+                with open(self.history_file, 'r', encoding='utf-8') as f:
+                    history = json.load(f)
+            except Exception as e:
+                print(f"⚠️ 輪詢歷史讀取失敗，重新開始: {e}")
+                history = {}
+
+        # 未指定論壇時沿用歷史中的論壇（workflow 的到期檢查不需載入監控器）
+        if self.forums is None:
+            self.forums = {forum: forum for forum in history}
+
+        for forum in self.forums:
+            state = history.setdefault(forum, {})
+            state.setdefault('last_poll_at', None)
+            state.setdefault('next_run_at', None)
+            state.setdefault('arrival_rate', None)
+            state.setdefault('match_yield', None)
+            state.setdefault('interval_minutes', self.default_interval)
+            state.setdefault('page_depth', self.default_depth)
+            state.setdefault('seen_ids', [])
+            state.setdefault('backlog_ids', [])
+            state.setdefault('retry_counts', {})
+            state.setdefault('runs', [])
+            state.setdefault('freshness_lags', [])
+        return history
+
+    def save_history(self):
+        """保存輪詢歷史"""
+        with open(self.history_file, 'w', encoding='utf-8') as f:
+            json.dump(self.history, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def parse_time(value):
+        """解析 ISO 格式時間（支援 Dcard 的 Z 結尾與 found_at_utc 的 UTC 結尾）"""
+        if not value:
+            return None
+        try:
+            value = str(value).replace('Z', '+00:00').replace(' UTC', '+00:00')
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed
+
+    def due_forums(self, now):
+        """回傳本次應輪詢的論壇"""
+        due = []
+        for forum in self.forums:
+            next_run = self.parse_time(self.history[forum]['next_run_at'])
+            if next_run is None or next_run <= now + timedelta(minutes=self.due_tolerance):
+                due.append(forum)
+        return due
+
+    def select_posts(self, forum, posts):
+        """過濾已抓取過的文章，並依排程深度截斷；截斷的文章留待下次"""
+        state = self.history[forum]
+        seen = set(state['seen_ids'])
+        backlog = set(state['backlog_ids'])
+        new_posts = [post for post in posts if post['id'] not in seen]
+        # 上次被截斷或抓取失敗的文章優先處理
+        new_posts.sort(key=lambda post: post['id'] not in backlog)
+        depth = state['page_depth']
+
+        self.pending_listings[forum] = {
+            'listed': len(posts),
+            # 到達數不含上次留下的文章，避免重複計算
+            'new': sum(1 for post in new_posts if post['id'] not in backlog),
+            'carried_over': sum(1 for post in new_posts if post['id'] in backlog),
+            'unseen_ids': [post['id'] for post in new_posts],
+            # 列表中全部都是新文章，代表實際到達數可能更多
+            'saturated': bool(posts) and len(new_posts) == len(posts),
+        }
+
+        print(f"🗂️ 列表 {len(posts)} 篇，未抓取 {len(new_posts)} 篇，本次深度 {depth}")
+        return new_posts[:depth]
+
+    def has_listing(self, forum):
+        """本次是否成功取得該論壇列表"""
+        return forum in self.pending_listings
+
+    def smooth(self, previous, observed):
+        if previous is None:
+            return observed
+        return self.smoothing * observed + (1 - self.smoothing) * previous
+
+    def record_poll(self, forum, now, posts, matches):
+        """根據本次輪詢結果更新到達率、匹配率與新鮮度延遲"""
+        listing = self.pending_listings.get(forum)
+        if listing is None:
+            return
+
+        state = self.history[forum]
+        fetched_ids = [post['id'] for post in posts if 'content' in post]
+        fetched_count = len(fetched_ids)
+
+        # 成功取得內容或已用標題 / 摘要匹配並保存的文章都算看過，避免重複通知；
+        # 其他抓取失敗的文章留待下次重試，超過次數就放棄
+        done = set(fetched_ids) | {match['id'] for match in matches}
+        retry_counts = state['retry_counts']
+        for post in posts:
+            if post['id'] not in done:
+                retry_counts[post['id']] = retry_counts.get(post['id'], 0) + 1
+                if retry_counts[post['id']] >= self.max_retries:
+                    print(f"⚠️ 文章 {post['id']} 抓取失敗 {self.max_retries} 次，不再重試")
+                    done.add(post['id'])
+        last_poll = self.parse_time(state['last_poll_at'])
+
+        # 列表來自熱門排序 (f_popular_v3_*)，這裡的到達率是「新進入熱門列表的速度」，
+        # 只能當作各版發文速度的近似值
+        if last_poll is not None:
+            hours = max((now - last_poll).total_seconds() / 3600, 1 / 60)
+            state['arrival_rate'] = self.smooth(state['arrival_rate'], listing['new'] / hours)
+
+        if fetched_count:
+            state['match_yield'] = self.smooth(state['match_yield'], len(matches) / fetched_count)
+
+        # 新鮮度延遲：文章 createdAt → 該筆匹配自己的 found_at
+        for match in matches:
+            created = self.parse_time(match.get('created_at'))
+            found = self.parse_time(match.get('found_at_utc'))
+            if created is not None and found is not None:
+                lag = (found - created).total_seconds() / 60
+                state['freshness_lags'].append(round(max(lag, 0), 1))
+        state['freshness_lags'] = state['freshness_lags'][-self.max_lags:]
+
+        attempted = [post['id'] for post in posts]
+        seen_ids = state['seen_ids'] + [i for i in attempted if i in done and i not in state['seen_ids']]
+        state['seen_ids'] = seen_ids[-self.max_seen_ids:]
+        state['backlog_ids'] = [i for i in listing['unseen_ids'] if i not in done]
+        state['retry_counts'] = {i: n for i, n in retry_counts.items() if i in state['backlog_ids']}
+
+        state['runs'].append({
+            'polled_at': now.isoformat(),
+            'listed': listing['listed'],
+            'new_posts': listing['new'],
+            'carried_over': listing['carried_over'],
+            'fetched': fetched_count,
+            'left_over': len(state['backlog_ids']),
+            'matches': len(matches),
+            'saturated': listing['saturated'],
+        })
+        state['runs'] = state['runs'][-self.max_runs:]
+        state['last_poll_at'] = now.isoformat()
+
+    def plan_forum(self, state):
+        """依到達率計算單一論壇的間隔與深度"""
+        rate = state['arrival_rate']
+        if not rate:
+            # 尚無資料或長期無新文章：沒有資料用預設值，零到達率則放到最長間隔
+            interval = self.default_interval if rate is None else self.max_interval
+            return interval, self.default_depth if rate is None else self.min_depth
+
+        interval = self.target_new_posts / rate * 60
+        runs = state['runs']
+        if runs and runs[-1]['saturated']:
+            interval /= 2
+        interval = min(max(interval, self.min_interval), self.max_interval)
+        return interval, self.depth_for(rate, interval)
+
+    def depth_for(self, rate, interval):
+        """間隔內預期到達數加 50% 餘裕，超過上限的部分由 backlog 帶到下次"""
+        depth = math.ceil(rate * interval / 60 * 1.5)
+        return min(max(depth, self.min_depth), self.max_depth)
+
+    def requests_per_hour(self, plan):
+        return sum(depth * 60 / interval for interval, depth in plan.values())
+
+    def fit_budget(self, plan):
+        """超出請求預算時，優先拉長匹配率低的論壇間隔，最後才縮減深度
+
+        拉長間隔時依新間隔重算深度，因此只有深度觸及上限或被縮減時才會少抓，
+        少抓的文章會留在 backlog 於下次輪詢補上。
+        """
+        by_yield = sorted(plan, key=lambda forum: self.history[forum]['match_yield'] or 0)
+
+        while self.requests_per_hour(plan) > self.request_budget:
+            stretchable = [f for f in by_yield if plan[f][0] < self.max_interval]
+            if not stretchable:
+                break
+            forum = stretchable[0]
+            interval, depth = plan[forum]
+            interval = min(interval * 1.5, self.max_interval)
+            rate = self.history[forum]['arrival_rate']
+            if rate is not None:
+                depth = self.depth_for(rate, interval)
+            plan[forum] = (interval, depth)
+
+        while self.requests_per_hour(plan) > self.request_budget:
+            shrinkable = [f for f in by_yield if plan[f][1] > self.min_depth]
+            if not shrinkable:
+                break
+            forum = shrinkable[0]
+            interval, depth = plan[forum]
+            plan[forum] = (interval, depth - 1)
+
+        return plan
+
+    @staticmethod
+    def lag_stats(lags):
+        """新鮮度延遲統計（分鐘）"""
+        if not lags:
+            return {'count': 0, 'p50': None, 'p90': None, 'max': None}
+        ordered = sorted(lags)
+
+        def percentile(p):
+            return ordered[min(int(p * len(ordered)), len(ordered) - 1)]
+
+        return {
+            'count': len(ordered),
+            'p50': percentile(0.5),
+            'p90': percentile(0.9),
+            'max': ordered[-1],
+        }
+
+    def replan(self, now):
+        """重新計算所有論壇的下次執行計畫並輸出指標"""
+        plan = {forum: self.plan_forum(self.history[forum]) for forum in self.forums}
+        plan = self.fit_budget(plan)
+
+        metrics = {
+            'generated_at': now.isoformat(),
+            'request_budget_per_hour': self.request_budget,
+            'planned_requests_per_hour': round(self.requests_per_hour(plan), 1),
+            'forums': {}
+        }
+
+        for forum, (interval, depth) in plan.items():
+            state = self.history[forum]
+            state['interval_minutes'] = round(interval)
+            state['page_depth'] = depth
+
+            last_poll = self.parse_time(state['last_poll_at'])
+            if last_poll is not None:
+                state['next_run_at'] = (last_poll + timedelta(minutes=interval)).isoformat()
+
+            metrics['forums'][forum] = {
+                'name': self.forums[forum],
+                'next_run_at': state['next_run_at'],
+                'interval_minutes': state['interval_minutes'],
+                'page_depth': depth,
+                'arrival_rate_per_hour': round(state['arrival_rate'], 2) if state['arrival_rate'] is not None else None,
+                'match_yield': round(state['match_yield'], 3) if state['match_yield'] is not None else None,
+                'freshness_lag_minutes': self.lag_stats(state['freshness_lags'])
+            }
+
+        self.save_history()
+        with open(self.plan_file, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+
+        self.pending_listings = {}
+        return metrics
+
+
+def main():
+    """供 workflow 在安裝瀏覽器前檢查是否有論壇到期"""
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    scheduler = PollScheduler(base_dir, os.path.join(base_dir, "results"))
+    due = scheduler.due_forums(datetime.now(timezone.utc))
+
+    # 尚無歷史時視為到期，讓監控器建立第一筆紀錄
+    is_due = bool(due) or not scheduler.forums
+    print(f"📅 到期論壇: {', '.join(due) or '無'}")
+
+    output = os.environ.get('GITHUB_OUTPUT')
+    if output:
+        with open(output, 'a', encoding='utf-8') as f:
+            f.write(f"due={'true' if is_due else 'false'}\n")
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,7 @@ from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import traceback
 import random
+from poll_scheduler import PollScheduler
 
 class NewAPIJewelryMonitor:
     """使用新 API 端點的金工珠寶監控工具"""
@@ -46,6 +47,13 @@ class NewAPIJewelryMonitor:
             }
         }
         
+        # 依各論壇活躍度排程輪詢
+        self.scheduler = PollScheduler(
+            self.base_dir,
+            self.results_dir,
+            {forum: config['name'] for forum, config in self.forum_configs.items()}
+        )
+        
         print("🔧 初始化新 API 金工珠寶監控器")
         print(f"📁 結果目錄: {self.results_dir}")
         print(f"📝 關鍵字數量: {len(self.keywords)}")
@@ -313,11 +321,14 @@ class NewAPIJewelryMonitor:
                     
                     # 解析回應中的文章 ID
                     basic_posts = self.parse_api_response(data, forum)
-                    print(f"✅ 找到 {len(basic_posts)} 篇文章，開始獲取完整內容...")
+                    
+                    # 只處理未看過的文章，數量依排程深度限制
+                    basic_posts = self.scheduler.select_posts(forum, basic_posts)
+                    print(f"✅ 找到 {len(basic_posts)} 篇新文章，開始獲取完整內容...")
                     
                     # 獲取每篇文章的完整內容
                     detailed_posts = []
-                    for i, post in enumerate(basic_posts[:15], 1):  # 限制處理數量避免過載
+                    for i, post in enumerate(basic_posts, 1):
                         print(f"📖 處理第 {i} 篇文章 (ID: {post['id']})...")
                         
                         article_detail = self.get_article_content(session, post['id'], forum_url)
@@ -565,6 +576,19 @@ class NewAPIJewelryMonitor:
         print(f"⏰ 開始時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"🎯 監控關鍵字: {len(self.keywords)} 個")
         
+        forums = {
+            'marriage': '結婚版',
+            'jewelry': '珠寶版',
+            'girl': '女孩版'
+        }
+        
+        # 先確認排程，沒有到期的論壇就不啟動瀏覽器、不寫任何檔案
+        due_forums = self.scheduler.due_forums(datetime.now(timezone.utc))
+        if not due_forums:
+            print("📅 本次沒有到期的論壇，跳過執行")
+            return
+        print(f"📅 本次排程論壇: {', '.join(forums[f] for f in due_forums)}")
+        
         driver = None
         try:
             # 創建瀏覽器
@@ -573,21 +597,16 @@ class NewAPIJewelryMonitor:
                 print("❌ 無法創建瀏覽器，監控中止")
                 return
             
-            forums = {
-                'marriage': '結婚版',
-                'jewelry': '珠寶版',
-                'girl': '女孩版'
-            }
-            
             all_matches = []
             successful_forums = 0
             
-            for forum_key, forum_name in forums.items():
+            for forum_key in due_forums:
+                forum_name = forums[forum_key]
                 try:
                     # 使用新版 API 獲取文章
                     posts = self.get_posts_via_new_api(driver, forum_key, forum_name)
                     
-                    if posts:
+                    if self.scheduler.has_listing(forum_key):
                         successful_forums += 1
                         matches = []
                         
@@ -606,6 +625,7 @@ class NewAPIJewelryMonitor:
                                 print(f"🎯 匹配文章: {title[:40]}... (關鍵字: {', '.join(matched_keywords[:3])})")
                         
                         all_matches.extend(matches)
+                        self.scheduler.record_poll(forum_key, datetime.now(timezone.utc), posts, matches)
                         print(f"✅ {forum_name} 完成，發現 {len(matches)} 篇匹配")
                     else:
                         print(f"❌ {forum_name} 無法獲取文章")
@@ -615,18 +635,25 @@ class NewAPIJewelryMonitor:
                     traceback.print_exc()
                 
                 # 論壇間等待
-                if forum_key != list(forums.keys())[-1]:
+                if forum_key != due_forums[-1]:
                     wait_time = random.uniform(5, 10)
                     print(f"⏳ 等待 {wait_time:.1f} 秒後處理下一個論壇...")
                     time.sleep(wait_time)
             
+            # 更新下次輪詢計畫（沒有任何論壇成功時保留原排程，下次重試）
+            schedule = None
+            if successful_forums:
+                schedule = self.scheduler.replan(datetime.now(timezone.utc))
+            
             # 生成摘要報告
             summary = {
                 'execution_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'method': 'new_api',
                 'successful_forums': successful_forums,
+                'polled_forums': len(due_forums),
                 'total_forums': len(forums),
                 'total_matches': len(all_matches),
+                'schedule': schedule,
                 'matches': all_matches
             }
             
@@ -644,7 +671,9 @@ class NewAPIJewelryMonitor:
             
             print(f"\n🎉 新版 API 監控任務完成!")
             print(f"⏱️ 執行時間: {duration} 秒")
-            print(f"📊 成功論壇: {successful_forums}/{len(forums)}")
+            print(f"📊 成功論壇: {successful_forums}/{len(due_forums)} (共 {len(forums)} 個論壇)")
+            for forum, plan in (schedule or {}).get('forums', {}).items():
+                print(f"   📅 {plan['name']}: 每 {plan['interval_minutes']} 分鐘，深度 {plan['page_depth']}，下次 {plan['next_run_at']}")
             print(f"🎯 總計發現: {len(all_matches)} 篇匹配文章")
             
             if all_matches: